@@ -4,6 +4,10 @@ from txbt import IEvent, InitAbort, Run, WaitFunctionCall
 from datapack import *
 from datapack.item_frame_hook import ItemFrameHook
 
+_byte_true = Byte(1)
+_ifh_tag = 'IFH'
+_ifh_tag_nbt = Str(_ifh_tag)
+
 class ItemFrame:
   onOut:Function
   onIn:Function
@@ -25,9 +29,10 @@ class ItemFrame:
   def __init__(self) -> None:
     self.__class__.init()
     self.id = gen_id(prefix='IFH.')
-    self.tags = [self.id,'IFH']
-    self.selector = Selector.E(McPath('item_frame'),tag=self.id,limit=1)
-    self.selfselector = Selector.S(tag=self.id)
+    self.tags = (self.id,_ifh_tag)
+    self._tags_nbt = List[Str]([Str(self.id),_ifh_tag_nbt])
+    self.selector = self._selector_nbt()
+    self.selfselector = self._selfselector_nbt()
     self._fixed = self.selector.nbt['Fixed',Byte]
     self._invulnerable = self.selector.nbt['Invulnerable',Byte]
 
@@ -36,25 +41,15 @@ class ItemFrame:
 
     回転：×、取得：×
     """
+    nbt:dict[str,Value[INbt]] = dict(
+      Tags=self._tags_nbt,
+      Invulnerable=_byte_true,
+      Facing=_byte_true,
+      Fixed=_byte_true
+      )
     if item:
-      return Command.Summon(
-        'item_frame',
-        pos,
-        Tags=List[Str]([Str(tag) for tag in self.tags]),
-        Invulnerable=Byte(1),
-        Facing=Byte(1),
-        Fixed=Byte(1),
-        Item=item.ToNbt(1)
-        )
-    else:
-      return Command.Summon(
-        'item_frame',
-        pos,
-        Tags=List[Str]([Str(tag) for tag in self.tags]),
-        Invulnerable=Byte(1),
-        Facing=Byte(1),
-        Fixed=Byte(1)
-        )
+      nbt['Item'] = item.ToNbt(1)
+    return Command.Summon('item_frame', pos, **nbt)
 
   def SummonEvent(self, pos: Position.IPosition, item: Item | None = None) -> IEvent:
     """
@@ -78,6 +73,16 @@ class ItemFrame:
       d["ItemRotation"] = Byte(rotation)
     return Compound(d)
 
+  def _selector_nbt(self,nbt:Compound|None=None):
+    """この額縁を指すセレクタ(self.selector) nbtを渡すとnbt条件を加える"""
+    kwargs = {} if nbt is None else {'nbt':nbt}
+    return Selector.E(McPath('item_frame'),tag=self.id,limit=1,**kwargs)
+
+  def _selfselector_nbt(self,nbt:Compound|None=None):
+    """実行者がこの額縁であることを表すセレクタ(self.selfselector) nbtを渡すとnbt条件を加える"""
+    kwargs = {} if nbt is None else {'nbt':nbt}
+    return Selector.S(tag=self.id,**kwargs)
+
   def item(self):
     """{id:Str,Count:Byte,tag:{CustomModelData:Int}}"""
     return self.selector.nbt["Item"]
@@ -87,13 +92,13 @@ class ItemFrame:
     return self.selector.nbt["ItemRotation",Byte]
 
   def ItemCondition(self,item:Item):
-    return (self.selector & Selector.E(nbt=self._getnbt(item))).IfEntity()
+    return self._selector_nbt(self._getnbt(item)).IfEntity()
 
   def RotateCondition(self,rotation:Literal[0,1,2,3,4,5,6,7]):
-    return (self.selector & Selector.E(nbt=self._getnbt(rotation=rotation))).IfEntity()
+    return self._selector_nbt(self._getnbt(rotation=rotation)).IfEntity()
 
   def ItemRotateCondition(self,item:Item,rotation:Literal[0,1,2,3,4,5,6,7]):
-    return (self.selector & Selector.E(nbt=self._getnbt(item,rotation))).IfEntity()
+    return self._selector_nbt(self._getnbt(item,rotation)).IfEntity()
 
   def WaitUntilPut(self):
     """何かしらのアイテムが入れられるまで待機
@@ -106,7 +111,7 @@ class ItemFrame:
     """特定のアイテムが入れられるまで待機
     """
     func = Function()
-    ItemFrame.onIn += (self.selfselector & Selector.S(nbt=self._getnbt(item))).IfEntity() + func.Call()
+    ItemFrame.onIn += self._selfselector_nbt(self._getnbt(item)).IfEntity() + func.Call()
     return WaitFunctionCall(func)
 
   def WaitUntilPick(self):
@@ -127,13 +132,14 @@ class ItemFrame:
     """特定の角度になるまで待機
     """
     func = Function()
-    ItemFrame.onRot += (self.selfselector & Selector.S(nbt=self._getnbt(rotation=rotation))).IfEntity() + func.Call()
+    ItemFrame.onRot += self._selfselector_nbt(self._getnbt(rotation=rotation)).IfEntity() + func.Call()
     return WaitFunctionCall(func)
 
   def WaitUntilMatchState(self,item:Item,rotation:Literal[0,1,2,3,4,5,6,7]):
     """特定のアイテムが入った状態で特定の角度になるまで待機
     """
     func = Function()
-    ItemFrame.onRot += (self.selfselector & Selector.S(nbt=self._getnbt(item,rotation))).IfEntity() + func.Call()
-    ItemFrame.onIn += (self.selfselector & Selector.S(nbt=self._getnbt(item,rotation))).IfEntity() + func.Call()
+    condition = self._selfselector_nbt(self._getnbt(item,rotation)).IfEntity()
+    ItemFrame.onRot += condition + func.Call()
+    ItemFrame.onIn += condition + func.Call()
     return WaitFunctionCall(func)
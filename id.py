@@ -1,17 +1,26 @@
-from random import randint
+from os import urandom
+from string import ascii_uppercase as _id_upper, ascii_lowercase as _id_lower, digits as _id_number
 
-_id_upper = tuple(map(chr, range(ord('A'), ord('Z')+1)))
-_id_lower = tuple(map(chr, range(ord('a'), ord('z')+1)))
-_id_number = tuple(map(chr, range(ord('0'), ord('9')+1)))
+_id_tables: dict[tuple[bool, bool, bool], tuple[bytes, bytes]] = {}
+
+def _id_table(upper: bool, lower: bool, number: bool):
+  """乱数バイトを文字に変換するbytes.translate用テーブルと、偏りを生むため捨てるバイトの組を返す"""
+  key = (upper, lower, number)
+  table = _id_tables.get(key)
+  if table is None:
+    chars = (_id_upper if upper else '') + (_id_lower if lower else '') + (_id_number if number else '')
+    if not chars:
+      raise ValueError('gen_id needs at least one character class')
+    # 256をlen(chars)で割り切れる範囲のバイトだけを使い、どの文字も等確率にする
+    limit = 256 - 256 % len(chars)
+    table = (bytes(ord(chars[i % len(chars)]) for i in range(256)), bytes(range(limit, 256)))
+    _id_tables[key] = table
+  return table
 
 def gen_id(length: int = 8, prefix: str = '', suffix: str = '', upper: bool = True, lower: bool = True, number: bool = True):
   """{length=8}桁のIDを生成する [0-9a-zA-Z]"""
-  chars: list[str] = []
-  if upper:
-    chars.extend(_id_upper)
-  if lower:
-    chars.extend(_id_lower)
-  if number:
-    chars.extend(_id_number)
-  maxidx = len(chars) - 1
-  return prefix + ''.join(chars[randint(0, maxidx)] for _ in range(length)) + suffix
+  table, reject = _id_table(upper, lower, number)
+  raw = b''
+  while len(raw) < length:
+    raw += urandom(length).translate(table, reject)
+  return prefix + raw[:length].decode('ascii') + suffix
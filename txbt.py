@@ -2,7 +2,7 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from copy import copy
 from enum import Enum, auto
-from random import randint
+from typing import TypeVar
 from typing_extensions import Self
 from datapack import Byte, Command, Compound, ConditionSubCommand, FunctionTag, ICommand, OhMyDat, Scoreboard, Function, Objective, StorageNbt, Value, McPath, Selector
 from id import gen_id
@@ -83,7 +83,7 @@ class ScoreboardIterator:
       match IEvent.mode:
         case _ExportMode.ENTITY:
           obj = Objective(gen_id(prefix='txbt:'))
-          score = obj.score(Selector.S())
+          score = obj.score(_self_selector)
           Installer.OnInstall += obj.Add()
           Installer.OnUninstall += obj.Remove()
         case _ExportMode.SERVER:
@@ -100,6 +100,18 @@ _flags_path = 'flags'
 _result_path = 'result'
 _temp_flag_path = 'tmp'
 _ticking_tag = 'txbt.tick'
+_self_selector = Selector.S()
+_ticking_selector = Selector.E(tag=_ticking_tag)
+_ticking_self_selector = Selector.S(tag=_ticking_tag)
+_byte_active = Byte(-1)
+_byte_success = Byte(1)
+_byte_failure = Byte(0)
+
+def _at_each(selector:Selector):
+  """selectorの各エンティティとして、その位置で実行する"""
+  return selector.As().At(_self_selector)
+
+_C = TypeVar('_C', bound='IComposit')
 
 class _ExportMode(Enum):
   ENTITY = auto()
@@ -108,6 +120,7 @@ class _ExportMode(Enum):
 class IEvent(metaclass=ABCMeta):
   objective = Objective('txbt')
   _objective_tick = Objective('txbt.tick')
+  _tick_score = _objective_tick.score(_self_selector)
 
   Installer.OnInstall += objective.Add()
   Installer.OnInstall += _objective_tick.Add()
@@ -130,16 +143,10 @@ class IEvent(metaclass=ABCMeta):
   intidata += _storage[_flags_path].remove()
   intidata += _storage[_data_path].remove()
 
-  _id_upper  = tuple(map(chr,range(ord('A'),ord('Z')+1)))
-  _id_lower  = tuple(map(chr,range(ord('a'),ord('z')+1)))
-  _id_number = tuple(map(chr,range(ord('0'),ord('9')+1)))
-  _id_chars = _id_upper+_id_lower+_id_number
-  _id_charsmax = len(_id_chars) - 1
-
   @staticmethod
   def nextId():
     """8桁のIDを生成する [0-9a-zA-Z]"""
-    return ''.join(IEvent._id_chars[randint(0,IEvent._id_charsmax)] for _ in range(8))
+    return gen_id()
 
   def __init__(self) -> None:
     pass
@@ -159,9 +166,9 @@ class IEvent(metaclass=ABCMeta):
   def activate(self):
     match IEvent.mode:
       case _ExportMode.SERVER:
-        return self._state_server.set(Byte(-1))
+        return self._state_server.set(_byte_active)
       case _ExportMode.ENTITY:
-        return Command.Tag.Add(Selector.S(),self._tag_entity)
+        return Command.Tag.Add(_self_selector,self._tag_entity)
   
   def getScore(self):
     return next(ScoreboardIterator.main)
@@ -172,13 +179,13 @@ class IEvent(metaclass=ABCMeta):
       case _ExportMode.SERVER:
         return self._state_server.remove()
       case _ExportMode.ENTITY:
-        return Command.Tag.Remove(Selector.S(), self._tag_entity)
+        return Command.Tag.Remove(_self_selector, self._tag_entity)
 
   @property
   def isActive(self):
     match IEvent.mode:
       case _ExportMode.SERVER:
-        return self._state_server.isMatch(Byte(-1))
+        return self._state_server.isMatch(_byte_active)
       case _ExportMode.ENTITY:
         return Selector.S(tag=self._tag_entity).IfEntity()
 
@@ -186,7 +193,7 @@ class IEvent(metaclass=ABCMeta):
   def notActive(self):
     match IEvent.mode:
       case _ExportMode.SERVER:
-        return self._state_server.notMatch(Byte(-1))
+        return self._state_server.notMatch(_byte_active)
       case _ExportMode.ENTITY:
         return Selector.S(tag=self._tag_entity).UnlessEntity()
 
@@ -199,28 +206,28 @@ class IEvent(metaclass=ABCMeta):
 
   @property
   def succeed(self):
-    return self.setReturn(Byte(1))
+    return self.setReturn(_byte_success)
 
   @property
   def fail(self):
-    return self.setReturn(Byte(0))
+    return self.setReturn(_byte_failure)
 
   @property
   def isFailed(self):
-    return IEvent._result.isMatch(Byte(0))
+    return IEvent._result.isMatch(_byte_failure)
 
   @property
   def isSucceeded(self):
-    return IEvent._result.isMatch(Byte(1))
+    return IEvent._result.isMatch(_byte_success)
   
   untick = Function()
-  untick += _objective_tick.score(Selector.S()).Remove(1)
-  untick += _objective_tick.score(Selector.S()).IfMatch(0) + Command.Tag.Remove(Selector.S(), _ticking_tag)
+  untick += _tick_score.Remove(1)
+  untick += _tick_score.IfMatch(0) + Command.Tag.Remove(_self_selector, _ticking_tag)
 
   def useTickTag(self,enter:Function,exit:Function,abort:Function):
     assert IEvent.mode is _ExportMode.ENTITY
-    enter += Command.Tag.Add(Selector.S(), _ticking_tag)
-    enter += IEvent._objective_tick.score(Selector.S()).Add(1)
+    enter += Command.Tag.Add(_self_selector, _ticking_tag)
+    enter += IEvent._tick_score.Add(1)
 
     exit += IEvent.untick.Call()
     abort += IEvent.untick.Call()
@@ -228,7 +235,7 @@ class IEvent(metaclass=ABCMeta):
   @property
   def hasTickTag(self):
     assert IEvent.mode is _ExportMode.ENTITY
-    return Selector.S(tag=_ticking_tag).IfEntity()
+    return _ticking_self_selector.IfEntity()
 
   @property
   @abstractmethod
@@ -322,7 +329,7 @@ class IEvent(metaclass=ABCMeta):
     FunctionTag.tick.append(tick)
     _tick = Function()
 
-    tick += Selector.E(tag=_ticking_tag).As().At(Selector.S()) + _tick.Call()
+    tick += _at_each(_ticking_selector) + _tick.Call()
 
     abort.description = """イベントを中断する
 該当エンティティとして実行すること"""
@@ -341,29 +348,23 @@ class IEvent(metaclass=ABCMeta):
       c = copy(self)
     return c
 
-  def __add__(self,other:IEvent):
+  def _combine(self,other:IEvent,cls:type[_C]) -> _C:
+    """selfとotherをclsでまとめる 既にclsであるものは子要素を展開して平坦にする"""
     subs = [self,other]
-    if isinstance(self,Traverse):
+    if isinstance(self,cls):
       subs[:1] = self.subs
-    if isinstance(other,Traverse):
+    if isinstance(other,cls):
       subs[-1:] = other.subs
-    return Traverse(*subs)
+    return cls(*subs)
+
+  def __add__(self,other:IEvent):
+    return self._combine(other,Traverse)
 
   def __and__(self,other:IEvent):
-    subs = [self,other]
-    if isinstance(self,ParallelTraverse):
-      subs[:1] = self.subs
-    if isinstance(other,ParallelTraverse):
-      subs[-1:] = other.subs
-    return ParallelTraverse(*subs)
+    return self._combine(other,ParallelTraverse)
 
   def __or__(self,other:IEvent):
-    subs = [self,other]
-    if isinstance(self,ParallelFirst):
-      subs[:1] = self.subs
-    if isinstance(other,ParallelFirst):
-      subs[-1:] = other.subs
-    return ParallelFirst(*subs)
+    return self._combine(other,ParallelFirst)
 
   def __invert__(self):
     return self.invert()
@@ -448,125 +449,98 @@ class WaitFunctionCall(IEvent):
   def main_entity(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
     exit = Function()
     # TODO: selectorをentity_type等で絞っておくことで検索効率を上げる
-    self.trigger += Selector.E(tag=self._tag_entity).As().At(Selector.S()) + exit.Call()
+    self.trigger += _at_each(Selector.E(tag=self._tag_entity)) + exit.Call()
     exit += self.succeed
     return exit
 
   @property
   def isInfinite(self) -> bool: return False
 
-class WaitWhile(IEvent):
-  """コマンドが成功しなくなるまで待機して失敗を返す"""
-  _funcmap:dict[str,Function] = {}
+class IWaitCondition(IEvent,metaclass=ABCMeta):
+  """コマンドの成否が`_exit_flag`になるまで毎tick確認して待機するイベントの共通部分"""
+  _exit_flag:Value[Byte]
 
   def __init__(self,condition:ICommand|ConditionSubCommand,pre_commands:list[ICommand]=[],post_commands:list[ICommand]=[]) -> None:
-    """
-    コマンドが成功しなくなるまで待機して失敗を返す
-
-    condition : 成功かどうかを確かめるコマンドor条件サブコマンド
-
-    pre_commands : condition実行前に実行するコマンド(任意)
-
-    post_commands : condition実行後に実行するコマンド(任意)
-    """
     super().__init__()
     self.condition = condition
     self.pre = pre_commands
     self.post = post_commands
 
-  def main_server(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
+  @property
+  @abstractmethod
+  def _exit_result(self) -> ICommand:pass
+
+  def _wait(self, func: Function, abort: Function, exit: Function, pre: list[ICommand], post: list[ICommand]):
     enter = Function()
-    exit = Function()
 
     abort += enter.clear_schedule()
     func += enter.Call()
 
-    enter.append(*self.pre)
+    enter.append(*pre)
     enter += IEvent._temp_flag.storeSuccess(1) + self.condition
-    enter.append(*self.post)
-    enter += IEvent._temp_flag.isMatch(Byte(0)) + exit.Call()
+    enter.append(*post)
+    enter += IEvent._temp_flag.isMatch(self._exit_flag) + exit.Call()
     enter += self.isActive + enter.schedule(1)
 
+  def main_server(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
+    exit = Function()
+    self._wait(func, abort, exit, self.pre, self.post)
+
     if not resultless:
-      exit += self.fail
+      exit += self._exit_result
     return exit
 
   def main_entity(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
     exit = Function()
     self.useTickTag(func,exit,abort)
-
-    enter = Function()
-
-    abort += enter.clear_schedule()
-    func += enter.Call()
-
-    enter += IEvent._temp_flag.storeSuccess(1) + self.condition
-    enter += IEvent._temp_flag.isMatch(Byte(0)) + exit.Call()
-    enter += self.isActive + enter.schedule(1)
+    self._wait(func, abort, exit, [], [])
 
     if not resultless:
-      exit += self.fail
+      exit += self._exit_result
     return exit
 
   @property
   def isInfinite(self) -> bool: return False
 
-class WaitUntil(IEvent):
-  """コマンドが成功するまで待機して成功を返す"""
+class WaitWhile(IWaitCondition):
+  """コマンドが成功しなくなるまで待機して失敗を返す"""
   _funcmap:dict[str,Function] = {}
+  _exit_flag = _byte_failure
 
   def __init__(self,condition:ICommand|ConditionSubCommand,pre_commands:list[ICommand]=[],post_commands:list[ICommand]=[]) -> None:
     """
-    コマンドが成功するまで待機して成功を返す
+    コマンドが成功しなくなるまで待機して失敗を返す
 
-    `condition` : 成功かどうかを確かめるコマンドor条件サブコマンド
+    condition : 成功かどうかを確かめるコマンドor条件サブコマンド
 
-    `pre_commands` : condition実行前に実行するコマンド(任意)
+    pre_commands : condition実行前に実行するコマンド(任意)
 
-    `post_commands` : condition実行後に実行するコマンド(任意)
+    post_commands : condition実行後に実行するコマンド(任意)
     """
-    super().__init__()
-    self.condition = condition
-    self.pre = pre_commands
-    self.post = post_commands
-
-  def main_server(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
-    enter = Function()
-    exit = Function()
-
-    abort += enter.clear_schedule()
-    func += enter.Call()
+    super().__init__(condition,pre_commands,post_commands)
 
-    enter.append(*self.pre)
-    enter += IEvent._temp_flag.storeSuccess(1) + self.condition
-    enter.append(*self.post)
-    enter += IEvent._temp_flag.isMatch(Byte(1)) + exit.Call()
-    enter += self.isActive + enter.schedule(1)
-
-    if not resultless:
-      exit += self.fail
-    return exit
+  @property
+  def _exit_result(self): return self.fail
 
-  def main_entity(self, func: Function, abort: Function, tick: Function, init: Function, resultless: bool) -> Function:
-    exit = Function()
-    self.useTickTag(func,exit,abort)
+class WaitUntil(IWaitCondition):
+  """コマンドが成功するまで待機して成功を返す"""
+  _funcmap:dict[str,Function] = {}
+  _exit_flag = _byte_success
 
-    enter = Function()
+  def __init__(self,condition:ICommand|ConditionSubCommand,pre_commands:list[ICommand]=[],post_commands:list[ICommand]=[]) -> None:
+    """
+    コマンドが成功するまで待機して成功を返す
 
-    abort += enter.clear_schedule()
-    func += enter.Call()
+    `condition` : 成功かどうかを確かめるコマンドor条件サブコマンド
 
-    enter += IEvent._temp_flag.storeSuccess(1) + self.condition
-    enter += IEvent._temp_flag.isMatch(Byte(1)) + exit.Call()
-    enter += self.isActive + enter.schedule(1)
+    `pre_commands` : condition実行前に実行するコマンド(任意)
 
-    if not resultless:
-      exit += self.fail
-    return exit
+    `post_commands` : condition実行後に実行するコマンド(任意)
+    """
+    super().__init__(condition,pre_commands,post_commands)
 
   @property
-  def isInfinite(self) -> bool: return False
-
+  def _exit_result(self): return self.succeed
 
 
 class IDecorator(IEvent,metaclass=ABCMeta):
@@ -907,7 +881,7 @@ class ParallelFirst(IComposit):
     for sub in self.subs:
       f = Function()
       func += self.isActive + f.Call()
-      end = sub._export(func,abt,tick,init,resultless)
+      end = sub._export(f,abt,tick,init,resultless)
       if not sub.isInfinite:
         end += exit.Call()
 